@@ -1,16 +1,64 @@
 import streamlit as st
 import pandas as pd
-import json
+import orjson
 import os
 from datetime import datetime
 import io
+import itertools
+import operator
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+import xlsxwriter
+from python_calamine import CalamineWorkbook
 
 st.set_page_config(page_title="Excel-JSON Converter", layout="wide")
 
-def excel_to_json(uploaded_files):
-    """Convert multiple Excel files to a single JSON with specific columns"""
-    combined_data = []
+# Desired order of fields when rearranging JSON data
+FIELD_ORDER = [
+    "Full Name",
+    "Email",
+    "Phone Number",
+    "School Name",
+    "Designation - Level",
+    "Region",
+    "District"
+]
+
+def open_first_sheet(file, min_row):
+    """Open the first sheet of an Excel file.
+    
+    Returns the number of columns in the sheet's used range and an iterator
+    over its rows as lists of cell values, starting at min_row (1-indexed).
+    calamine loads the whole sheet up front for speed; only the conversion
+    of rows to Python objects is lazy.
+    """
+    sheet = CalamineWorkbook.from_filelike(file).get_sheet_by_index(0)
+    if sheet.start is None:
+        # Empty sheet
+        return 0, iter(())
+    
+    # iter_rows starts at the first used column, so pad rows back out to column A
+    leading_blanks = [""] * sheet.start[1]
+    rows = (leading_blanks + row for row in itertools.islice(sheet.iter_rows(), min_row - 1, None))
+    return sheet.start[1] + sheet.width, rows
+
+def cell_to_str(value):
+    """Convert a cell value to its string form, with blank cells as empty strings"""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        # Whole numbers can come back as floats from calamine
+        value = int(value)
+    return str(value)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def parse_excel_file(file_bytes, file_name):
+    """Extract the specific columns from a single Excel file.
     
+    Returns the records and a list of (level, message) status messages for
+    the caller to display. Results are cached on the file contents so
+    re-running the conversion doesn't parse the same upload again.
+    """
     # Columns to capture (0-indexed, so C=2, D=3, E=4, F=5, H=7, I=8, J=9)
     columns_to_capture = [2, 3, 4, 5, 7, 8, 9]
     
@@ -25,83 +73,170 @@ def excel_to_json(uploaded_files):
         "District"
     ]
     
-    for file in uploaded_files:
-        try:
-            # Read Excel file without header inference
-            df = pd.read_excel(file, header=None)
+    # Number of header rows before the data starts
+    header_rows = 2
+    
+    messages = []
+    valid_records = []
+    
+    try:
+        # Rows after the header rows are converted only up to the first empty row
+        num_columns, rows = open_first_sheet(io.BytesIO(file_bytes), min_row=header_rows + 1)
+        
+        # Check that the specified columns exist
+        if num_columns <= max(columns_to_capture):
+            messages.append(("warning", f"File {file_name} doesn't have enough columns. Expected at least {max(columns_to_capture)+1} columns."))
+            return valid_records, messages
+        
+        pick_columns = operator.itemgetter(*columns_to_capture)
+        
+        # Process until we hit an empty row, selecting, converting and
+        # checking each row in a single pass
+        for offset, row in enumerate(rows):
+            values = [cell_to_str(value) for value in pick_columns(row)]
             
-            # Skip the header row(s) if needed
-            # Assuming the header is in the first row and data starts from second row
-            if len(df) > 2:
-                df = df.iloc[2:]
+            # Check if row is empty (all values are blank)
+            if all(not value or value.isspace() for value in values):
+                messages.append(("info", f"Empty row detected at row {offset + header_rows} in file {file_name}. Stopping processing."))
+                break
             
-            # Select only the specified columns if they exist
-            if max(columns_to_capture) < len(df.columns):
-                selected_df = df.iloc[:, columns_to_capture]
-                
-                # Rename columns to the desired field names
-                selected_df.columns = field_names
-                
-                # Process until we hit an empty row
-                valid_records = []
-                for index, row in selected_df.iterrows():
-                    # Check if row is empty (all values are NaN or empty string)
-                    is_empty = row.isna().all() or (row.astype(str).str.strip() == '').all()
-                    
-                    if is_empty:
-                        st.info(f"Empty row detected at row {index} in file {file.name}. Stopping processing.")
-                        break
-                    
-                    # Add valid row to records
-                    valid_records.append(row.fillna("").to_dict())
-                
-                combined_data.extend(valid_records)
-                st.success(f"Processed {len(valid_records)} rows from {file.name}")
-            else:
-                st.warning(f"File {file.name} doesn't have enough columns. Expected at least {max(columns_to_capture)+1} columns.")
+            # Add valid row to records
+            valid_records.append(dict(zip(field_names, values)))
+        
+        messages.append(("success", f"Processed {len(valid_records)} rows from {file_name}"))
+        
+    except Exception as e:
+        import traceback
+        messages.append(("error", f"Error processing {file_name}: {str(e)}"))
+        messages.append(("error", traceback.format_exc()))
+        valid_records = []
+    
+    return valid_records, messages
+
+def excel_to_json(uploaded_files):
+    """Convert multiple Excel files to a single JSON with specific columns"""
+    combined_data = []
+    
+    # Parse the files concurrently; Streamlit calls stay on this thread
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(uploaded_files)))) as executor:
+        results = executor.map(
+            parse_excel_file,
+            [file.getvalue() for file in uploaded_files],
+            [file.name for file in uploaded_files]
+        )
+        
+        log = []
+        problem_files = 0
+        for valid_records, messages in results:
+            log.extend(messages)
+            combined_data.extend(valid_records)
             
-        except Exception as e:
-            st.error(f"Error processing {file.name}: {str(e)}")
-            import traceback
-            st.error(traceback.format_exc())
+            # Count files, not messages (an error also logs its traceback)
+            if any(level in ("warning", "error") for level, _ in messages):
+                problem_files += 1
+    
+    # Show the per-file messages as one log rather than one element each
+    if problem_files:
+        st.warning(f"{problem_files} file(s) had problems during processing. See the processing log for details.")
+    
+    with st.expander("Processing log", expanded=bool(problem_files)):
+        st.text("\n".join(message for _, message in log))
             
     return combined_data
 
-def rearrange_json_fields(json_data):
-    """Rearrange JSON data fields to move Email before Phone Number"""
-    rearranged_data = []
-    
-    # Define the desired order of fields
-    field_order = [
-        "Full Name",
-        "Email",
-        "Phone Number",
-        "School Name",
-        "Designation - Level",
-        "Region",
-        "District"
-    ]
-    
-    for record in json_data:
-        rearranged_record = {field: record.get(field, "") for field in field_order}
-        rearranged_data.append(rearranged_record)
+def records_to_dataframe(records):
+    """Convert JSON records to a DataFrame, with missing fields as empty strings"""
+    # Object dtype keeps numbers from being upcast to float around the gaps,
+    # and where() fills them without fillna()'s downcasting. Missing keys
+    # come through as NaN, while explicit JSON nulls stay None and are kept.
+    df = pd.DataFrame(records, dtype=object)
+    df = df.where(df.notna() | df.map(lambda value: value is None), "")
     
-    return rearranged_data
+    # Store all-text columns (every column of converted Excel data) as Arrow
+    # strings, which take far less memory than Python str objects
+    string_columns = [column for column in df.columns if pd.api.types.infer_dtype(df[column], skipna=False) == "string"]
+    return df.astype({column: "string[pyarrow]" for column in string_columns})
 
-def json_to_excel(json_data):
-    """Convert JSON data back to Excel file"""
+def rearrange_json_fields(df):
+    """Rearrange DataFrame columns to move Email before Phone Number"""
+    # Reorder all records at once, filling only the fields that are added
+    # with empty strings (records_to_dataframe has already filled the gaps)
+    return df.reindex(columns=FIELD_ORDER, fill_value="")
+
+def hash_dataframe(df):
+    """Hash a DataFrame's full contents and column names for st.cache_data"""
+    # Streamlit only hashes a sample of rows for large frames, which could
+    # hand back a stale workbook for data that differs outside the sample
+    try:
+        # hash_pandas_object compares object values by str(), so also hash
+        # each value's type to tell 1 and True apart from "1" and "True"
+        object_columns = df.columns[df.dtypes == object]
+        value_types = df[object_columns].map(lambda value: type(value).__name__)
+        return (
+            tuple(df.columns),
+            tuple(str(dtype) for dtype in df.dtypes),
+            pd.util.hash_pandas_object(df).values.tobytes(),
+            pd.util.hash_pandas_object(value_types).values.tobytes()
+        )
+    except TypeError:
+        # Unhashable values such as nested lists or dicts
+        return pickle.dumps(df)
+
+@st.cache_data(show_spinner=False, max_entries=16, hash_funcs={pd.DataFrame: hash_dataframe})
+def json_to_excel(df):
+    """Convert JSON data (as a DataFrame) back to Excel file"""
     output = io.BytesIO()
     
-    # Convert JSON to DataFrame
-    df = pd.DataFrame(json_data)
-    
-    # Write to Excel
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name="Staff Data", index=False)
+    # Write rows straight to the sheet; constant_memory flushes each row once written
+    # and strings_to_urls=False keeps URL-like text as plain strings
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True, 'strings_to_urls': False})
+    sheet = workbook.add_worksheet("Staff Data")
+    sheet.write_row(0, 0, list(df.columns))
+    for row_number, row in enumerate(df.itertuples(index=False, name=None), start=1):
+        sheet.write_row(row_number, 0, row)
+    workbook.close()
     
     output.seek(0)
     return output
 
+@st.cache_data(show_spinner=False, max_entries=16)
+def load_json(file_bytes):
+    """Parse an uploaded JSON file into a DataFrame, cached on the file contents"""
+    return records_to_dataframe(orjson.loads(file_bytes))
+
+def json_source_widget(key_suffix):
+    """Let the user pick previously converted JSON or upload a JSON file.
+    
+    Returns the selected data as a DataFrame, or None if there is none yet.
+    """
+    # Option to use previously converted JSON or upload a new JSON file
+    json_source = st.radio(
+        "JSON Source",
+        ["Upload JSON file", "Use previously converted JSON"],
+        index=1 if "json_data" in st.session_state else 0,
+        key=f"json_source_{key_suffix}"
+    )
+    
+    json_data = None
+    
+    if json_source == "Upload JSON file":
+        json_file = st.file_uploader("Upload JSON file", type=["json"], key=f"upload_json_{key_suffix}")
+        
+        if json_file:
+            try:
+                json_data = load_json(json_file.getvalue())
+                st.success(f"JSON file loaded successfully with {len(json_data)} records")
+            except Exception as e:
+                st.error(f"Error loading JSON file: {str(e)}")
+    else:
+        if "json_data" in st.session_state:
+            json_data = st.session_state.json_data
+            st.success(f"Using previously converted JSON data with {len(json_data)} records")
+        else:
+            st.warning("No previously converted JSON data found. Please convert Excel files first or upload a JSON file.")
+    
+    return json_data
+
 def main():
     st.title("Staff Data Excel-JSON Converter")
     
@@ -144,19 +279,19 @@ def main():
                         # Show total records
                         st.success(f"Successfully converted {len(combined_data)} total records")
                         
-                        # Provide download option
-                        json_string = json.dumps(combined_data, indent=4)
+                        # Provide download option (compact JSON, about half the size of indented)
+                        json_bytes = orjson.dumps(combined_data)
                         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                         
                         st.download_button(
                             label="Download JSON",
-                            data=json_string,
+                            data=json_bytes,
                             file_name=f"staff_data_{timestamp}.json",
                             mime="application/json"
                         )
                         
                         # Save for later use in session state
-                        st.session_state.json_data = combined_data
+                        st.session_state.json_data = records_to_dataframe(combined_data)
                     else:
                         st.error("No data was converted. Please check the files and try again.")
 
@@ -176,33 +311,9 @@ def main():
         7. District
         """)
         
-        # Option to use previously converted JSON or upload a new JSON file
-        json_source = st.radio(
-            "JSON Source",
-            ["Upload JSON file", "Use previously converted JSON"],
-            index=1 if "json_data" in st.session_state else 0,
-            key="json_source_rearrange"
-        )
-        
-        json_data = None
-        
-        if json_source == "Upload JSON file":
-            json_file = st.file_uploader("Upload JSON file", type=["json"], key="upload_json_rearrange")
-            
-            if json_file:
-                try:
-                    json_data = json.load(json_file)
-                    st.success(f"JSON file loaded successfully with {len(json_data)} records")
-                except Exception as e:
-                    st.error(f"Error loading JSON file: {str(e)}")
-        else:
-            if "json_data" in st.session_state:
-                json_data = st.session_state.json_data
-                st.success(f"Using previously converted JSON data with {len(json_data)} records")
-            else:
-                st.warning("No previously converted JSON data found. Please convert Excel files first or upload a JSON file.")
+        json_data = json_source_widget("rearrange")
         
-        if json_data:
+        if json_data is not None and len(json_data) > 0:
             if st.button("Rearrange JSON"):
                 with st.spinner("Rearranging JSON data..."):
                     # Rearrange JSON fields
@@ -210,18 +321,18 @@ def main():
                     
                     # Display sample of rearranged data
                     st.subheader("Sample of Rearranged Data (First 5 records)")
-                    st.json(rearranged_data[:5] if len(rearranged_data) > 5 else rearranged_data)
+                    st.json(rearranged_data.head(5).to_dict(orient='records'))
                     
                     # Show total records
                     st.success(f"Successfully rearranged {len(rearranged_data)} records")
                     
-                    # Provide download option
-                    json_string = json.dumps(rearranged_data, indent=4)
+                    # Provide download option (compact JSON, about half the size of indented)
+                    json_bytes = orjson.dumps(rearranged_data.to_dict(orient='records'))
                     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                     
                     st.download_button(
                         label="Download Rearranged JSON",
-                        data=json_string,
+                        data=json_bytes,
                         file_name=f"rearranged_staff_data_{timestamp}.json",
                         mime="application/json"
                     )
@@ -242,37 +353,12 @@ def main():
     with tab3:
         st.header("Convert JSON to Excel")
         
-        # Option to use previously converted JSON or upload a new JSON file
-        json_source = st.radio(
-            "JSON Source",
-            ["Upload JSON file", "Use previously converted JSON"],
-            index=1 if "json_data" in st.session_state else 0,
-            key="json_source_excel"
-        )
-        
-        json_data = None
-        
-        if json_source == "Upload JSON file":
-            json_file = st.file_uploader("Upload JSON file", type=["json"], key="upload_json_excel")
-            
-            if json_file:
-                try:
-                    json_data = json.load(json_file)
-                    st.success(f"JSON file loaded successfully with {len(json_data)} records")
-                except Exception as e:
-                    st.error(f"Error loading JSON file: {str(e)}")
-        else:
-            if "json_data" in st.session_state:
-                json_data = st.session_state.json_data
-                st.success(f"Using previously converted JSON data with {len(json_data)} records")
-            else:
-                st.warning("No previously converted JSON data found. Please convert Excel files first or upload a JSON file.")
+        json_data = json_source_widget("excel")
         
-        if json_data:
+        if json_data is not None and len(json_data) > 0:
             # Show preview of JSON structure (first record)
-            if len(json_data) > 0:
-                st.subheader("Sample Record Preview")
-                st.json(json_data[0])
+            st.subheader("Sample Record Preview")
+            st.json(json_data.iloc[0].to_dict())
             
             if st.button("Convert to Excel"):
                 with st.spinner("Converting to Excel..."):